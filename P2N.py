@@ -10,18 +10,62 @@ import schedule
 import time
 from datetime import datetime
 import pytz
+from zoneinfo import ZoneInfo
 import tempfile
 from pathlib import Path
 from openpyxl import load_workbook
+import xlsxwriter
 from openpyxl.worksheet.table import Table, TableStyleInfo
 import base64
+import hashlib
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+import functools
+import itertools
+import orjson
+from typing import Any, BinaryIO, Iterator
+from concurrent.futures import ThreadPoolExecutor
+import math
+import threading
 
 logging.basicConfig(level=logging.INFO)
 
 
+def _memoize_env(name: str):
+    """
+    Decorator for getters of the class Environment. Stores the resolved value under the given name in Environment._cache after the first successful call and returns it on every following call.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self):
+            # a cached call is a single dict lookup, the default and validation logic only runs on a miss
+            try:
+                return self.__class__._cache[name]
+            except KeyError:
+                value = self.__class__._cache[name] = func(self)
+                return value
+
+        return wrapper
+
+    return decorator
+
+
+class NoDataChange(Exception):
+    """
+    Raised if the data fetched from Pretix has not changed since the last successful run, so that Main can skip this run.
+    """
+
+    def __init__(self, message: str = "No changes in data since last fetch."):
+        super().__init__(message)
+
+
 class Environment:
+    _cache: dict[str, Any] = {}  # global variable to store resolved environment values
+    default_pretix_cache_ttl_seconds = 300  # fallback if not set in set_defaults()
+    default_upload_workers = 8  # fallback if not set in set_defaults()
+    default_output_format = "xlsx"  # fallback if not set in set_defaults()
+    default_excel_width_sample_rows = 4096  # fallback if not set in set_defaults()
 
     def set_defaults(
         self,
@@ -35,6 +79,10 @@ class Environment:
         default_check_interval_seconds: int = None,
         default_run_once: str = None,
         default_logging_level: str = None,
+        default_pretix_cache_ttl_seconds: int = None,
+        default_upload_workers: int = None,
+        default_output_format: str = None,
+        default_excel_width_sample_rows: int = None,
     ):
         """
         Sets default values for the class as global class variables. Only parameters that are not None will be applied.
@@ -46,7 +94,17 @@ class Environment:
                 continue  # skip the instance reference
             if value is not None:
                 setattr(self.__class__, attr, value)
-                
+
+        # resolved values may depend on the defaults, so they need to be resolved again
+        self.clear_cache()
+
+    def clear_cache(self) -> None:
+        """
+        Clear all cached environment values so that they are read again on the next call of their getters.
+        """
+
+        self.__class__._cache.clear()
+
     def _get_class_variable_value(self, name: str):
         """
         Returns value for a class variable set in set_defaults().
@@ -57,6 +115,7 @@ class Environment:
             return ""
         return value
 
+    @_memoize_env("PRETIX_URL")
     def get_pretix_url(self) -> str:
         """
         Return the Pretix base URL from environment variable 'PRETIX_URL'.
@@ -76,6 +135,7 @@ class Environment:
 
         return pretix_url
 
+    @_memoize_env("PRETIX_API_TOKEN")
     def get_pretix_api_token(self) -> str:
         """
         Return the Pretix API token from environment variable 'PRETIX_API_TOKEN'.
@@ -100,6 +160,7 @@ class Environment:
 
         return secret
 
+    @_memoize_env("PRETIX_EVENT_SLUG")
     def get_pretix_event_slug(self) -> str:
         """
         Return the Pretix event slug from environment variable 'PRETIX_EVENT_SLUG'.
@@ -109,6 +170,7 @@ class Environment:
 
         return event_slug
 
+    @_memoize_env("PRETIX_ORGANIZER_SLUG")
     def get_pretix_orgnizer_slug(self) -> str:
         """
         Return the Pretix organizer slug from environment variable 'PRETIX_ORGANIZER_SLUG'.
@@ -123,6 +185,7 @@ class Environment:
 
         return orgnizer_slug
 
+    @_memoize_env("EXCEL_MAX_COLUMN_WIDTH")
     def get_excel_max_column_width(self) -> int:
         """
         Return the max column width for excel files from environment variable 'EXCEL_MAX_COLUMN_WIDTH'.
@@ -148,6 +211,7 @@ class Environment:
 
         return width
 
+    @_memoize_env("NEXTCLOUD_URL")
     def get_nextcloud_url(self) -> str:
         """
         Return the Nextcloud URL from environment variable 'NEXTCLOUD_URL'.
@@ -167,6 +231,7 @@ class Environment:
 
         return pretix_url
 
+    @_memoize_env("NEXTCLOUD_USERNAME")
     def get_nextcloud_username(self) -> str:
         """
         Return the Nextcloud username from environment variable 'NEXTCLOUD_USERNAME'.
@@ -191,6 +256,7 @@ class Environment:
 
         return secret
 
+    @_memoize_env("NEXTCLOUD_PASSWORD")
     def get_nextcloud_password(self) -> str:
         """
         Return the Nextcloud password from environment variable 'NEXTCLOUD_PASSWORD'.
@@ -215,6 +281,7 @@ class Environment:
 
         return secret
 
+    @_memoize_env("NEXTCLOUD_UPLOAD_DIR")
     def get_nextcloud_upload_dir(self) -> str:
         """
         Return the Nextcloud upload directory from environment variable 'NEXTCLOUD_UPLOAD_DIR'.
@@ -231,6 +298,7 @@ class Environment:
 
         return upload_dir
 
+    @_memoize_env("TZ")
     def get_timezone(self) -> str:
         """
         Return the timezone from environment variable 'TZ'.
@@ -245,6 +313,7 @@ class Environment:
 
         return timezone
 
+    @_memoize_env("INTERVAL_MINUTES")
     def get_interval_minutes(self) -> int:
         """
         Return the interval in minutes to run the main function in loop from environment variable 'INTERVAL_MINUTES'.
@@ -270,6 +339,7 @@ class Environment:
 
         return minutes
 
+    @_memoize_env("CHECK_INTERVAL_SECONDS")
     def get_check_interval_seconds(self) -> int:
         """
         Return the interval in second to check if the time to wait for running again is over. From environment variable 'CHECK_INTERVAL_SECONDS'.
@@ -295,6 +365,85 @@ class Environment:
 
         return seconds
 
+    @_memoize_env("PRETIX_CACHE_TTL_SECONDS")
+    def get_pretix_cache_ttl_seconds(self) -> int:
+        """
+        Return the time in seconds for which questions and items fetched from Pretix are reused. From environment variable 'PRETIX_CACHE_TTL_SECONDS'.
+        """
+
+        try:
+            default = int(self._get_class_variable_value("default_pretix_cache_ttl_seconds"))
+        except Exception:
+            raise Exception("Environment.__class__.default_pretix_cache_ttl_seconds can't be translated to integer. Check the value you entered while calling set_defaults() function.")
+
+        str_seconds = self._get_env(name="PRETIX_CACHE_TTL_SECONDS", default=str(default))
+
+        try:
+            seconds = int(str_seconds)
+        except ValueError:
+            logging.error(f"Environment variable 'PRETIX_CACHE_TTL_SECONDS' must be an integer. Using default value '{default}'.")
+            return default
+
+        min_value = 0
+        if seconds < min_value:
+            logging.error(f"Environment variable 'PRETIX_CACHE_TTL_SECONDS' must be at least {min_value}. Using default value '{default}'.")
+            return default
+
+        return seconds
+
+    @_memoize_env("UPLOAD_WORKERS")
+    def get_upload_workers(self) -> int:
+        """
+        Return the number of files that are uploaded to Nextcloud in parallel. From environment variable 'UPLOAD_WORKERS'.
+        """
+
+        try:
+            default = int(self._get_class_variable_value("default_upload_workers"))
+        except Exception:
+            raise Exception("Environment.__class__.default_upload_workers can't be translated to integer. Check the value you entered while calling set_defaults() function.")
+
+        str_workers = self._get_env(name="UPLOAD_WORKERS", default=str(default))
+
+        try:
+            workers = int(str_workers)
+        except ValueError:
+            logging.error(f"Environment variable 'UPLOAD_WORKERS' must be an integer. Using default value '{default}'.")
+            return default
+
+        min_value = 1
+        if workers < min_value:
+            logging.error(f"Environment variable 'UPLOAD_WORKERS' must be at least {min_value}. Using default value '{default}'.")
+            return default
+
+        return workers
+
+    @_memoize_env("EXCEL_WIDTH_SAMPLE_ROWS")
+    def get_excel_width_sample_rows(self) -> int:
+        """
+        Return the number of rows that column widths of larger excel files are computed from. From environment variable 'EXCEL_WIDTH_SAMPLE_ROWS'.
+        """
+
+        try:
+            default = int(self._get_class_variable_value("default_excel_width_sample_rows"))
+        except Exception:
+            raise Exception("Environment.__class__.default_excel_width_sample_rows can't be translated to integer. Check the value you entered while calling set_defaults() function.")
+
+        str_rows = self._get_env(name="EXCEL_WIDTH_SAMPLE_ROWS", default=str(default))
+
+        try:
+            rows = int(str_rows)
+        except ValueError:
+            logging.error(f"Environment variable 'EXCEL_WIDTH_SAMPLE_ROWS' must be an integer. Using default value '{default}'.")
+            return default
+
+        min_value = 1
+        if rows < min_value:
+            logging.error(f"Environment variable 'EXCEL_WIDTH_SAMPLE_ROWS' must be at least {min_value}. Using default value '{default}'.")
+            return default
+
+        return rows
+
+    @_memoize_env("RUN_ONCE")
     def get_run_once(self) -> bool:
         """
         Return wheather to run once from environment variable 'RUN_ONCE'.
@@ -315,6 +464,7 @@ class Environment:
 
         raise ValueError(f"Environment variable 'RUN_ONCE' must be either 'true' or 'false'. Current value: '{run_once}'")
 
+    @_memoize_env("LOGGING_LEVEL")
     def get_logging_level(self) -> int:
         """
         Return logging level from environment variable 'LOGGING_LEVEL'.
@@ -340,6 +490,26 @@ class Environment:
 
         raise ValueError(f"Environment variable 'LOGGING_LEVEL' must be either 'debug', 'info', 'warning', or 'error'. Current value: '{logging_level}'.")
         
+    @_memoize_env("OUTPUT_FORMAT")
+    def get_output_format(self) -> str:
+        """
+        Return the file format of the uploaded tables ('xlsx' or 'csv') from environment variable 'OUTPUT_FORMAT'.
+        """
+
+        try:
+            default = str(self._get_class_variable_value("default_output_format"))
+        except Exception:
+            raise Exception("Environment.__class__.default_output_format can't be stringified. Check the value you entered while calling set_defaults() function.")
+
+        output_format = self._get_env(name="OUTPUT_FORMAT", default=default)
+        output_format = output_format.lower().lstrip(".")
+
+        if output_format in ("xlsx", "csv"):
+            return output_format
+
+        raise ValueError(f"Environment variable 'OUTPUT_FORMAT' must be either 'xlsx' or 'csv'. Current value: '{output_format}'.")
+
+    @_memoize_env("DOCKER_IMAGE")
     def get_docker_image_version(self) -> str:
         """
         Return the Docker version from environment variable 'DOCKER_IMAGE'.
@@ -371,11 +541,13 @@ class Environment:
             if default:
                 env = default
 
-                logging_text = f"Environment Variable '{name}' is not set. Using default '{default}'."
-                if info_log is True:
-                    logging.info(logging_text)
-                else:
-                    logging.debug(logging_text)
+                # lazy %-formatting, the debug message is only built if debug logging is enabled
+                logging.log(
+                    logging.INFO if info_log is True else logging.DEBUG,
+                    "Environment Variable '%s' is not set. Using default '%s'.",
+                    name,
+                    default,
+                )
 
             else:
                 raise ValueError(f"Environment Variable '{name}' is not set.")
@@ -409,22 +581,64 @@ class Environment:
         Decode the given data from base64 if it starts with the specified prefix.
         """
 
-        if isinstance(data, str):
-            stripped_data = data.strip()
+        # fast path for the common case of plain values: no need to strip (and copy) them
+        if not isinstance(data, str) or prefix not in data:
+            return data
 
-            if stripped_data.startswith(prefix):
-                try:
-                    b64_content = stripped_data[len(prefix) :]
-                    data = base64.b64decode(b64_content).decode("utf-8").strip("\n")
-                except Exception as e:
-                    raise Exception(f"Error while decoding base64: {e}")
+        stripped_data = data.strip()
+
+        if stripped_data.startswith(prefix):
+            try:
+                b64_content = stripped_data[len(prefix) :]
+                data = base64.b64decode(b64_content).decode("utf-8").strip("\n")
+            except Exception as e:
+                raise Exception(f"Error while decoding base64: {e}")
 
         return data
 
 
 class PretixAPI:
-    last_raw_df = None  # global variable to store last fetched raw dataframe
-    
+    last_raw_digest = None  # global variable to store the digest of the last fetched raw dataframe
+    ORDER_COLUMNS = [
+        "order_code",
+        "status",
+        "email",
+        "total",
+        "date",
+        "invoice_name",
+        "invoice_company",
+        "invoice_street",
+        "invoice_zipcode",
+        "invoice_city",
+        "invoice_country",
+        "invoice_vat_id",
+    ]  # columns of get_raw_df() filled per order
+    POSITION_COLUMNS = [
+        "position_id",
+        "item_id",
+        "item_name",
+        "price",
+        "attendee_firstname",
+        "attendee_lastname",
+        "attendee_email",
+        "attendee_street",
+        "attendee_zipcode",
+        "attendee_city",
+        "attendee_country",
+    ]  # columns of get_raw_df() filled per order position
+    _questions_cache = None  # global variable to store (timestamp, question map) of last fetch
+    _items_cache = None  # global variable to store (timestamp, item map) of last fetch
+    _question_ids_by_text_cache = None  # global variable to store (question map, normalized text -> ids) of last fetch
+    _question_column_layout_cache = None  # global variable to store (question map, qtext -> column name) of last fetch
+    _answer_choices_cache = None  # global variable to store (question map, normalized text -> answer choices) of last fetch
+    _session = None  # global variable to share one HTTP session across all instances
+    _validators = {}  # global variable to store conditional request headers (from ETag/Last-Modified) of the last fetch per list endpoint
+    REQUEST_TIMEOUT = 30  # seconds to wait for a response of the Pretix API
+    CHOICE_TEXT_KEYS = ("label", "text", "answer", "name", "title", "display")  # keys of an answer option that may hold its text
+    PREFERRED_LANGUAGES = ("de", "de-DE", "en", "en-US")  # translations to prefer, in this order
+    NAME_LANGUAGES = ("de",)  # translations to prefer for question and item names, otherwise the first available one is used
+    _last_source_maps = None  # global variable to store (question map, item map) the last raw dataframe was built from
+
     def __init__(self):
         """
         Initialize, fetch data from Pretix API.
@@ -435,45 +649,314 @@ class PretixAPI:
         pretix_organizer = env.get_pretix_orgnizer_slug()
         pretix_event = env.get_pretix_event_slug()
         pretix_api_token = env.get_pretix_api_token()
+        self.cache_ttl = env.get_pretix_cache_ttl_seconds()
 
-        self.pretix_api_url = os.path.join(pretix_url, "api/v1/organizers", pretix_organizer, "events", pretix_event)
+        self.pretix_api_url = f"{pretix_url.rstrip('/')}/api/v1/organizers/{pretix_organizer}/events/{pretix_event}"
+        self._url_questions = f"{self.pretix_api_url}/questions/"
+        self._url_items = f"{self.pretix_api_url}/items/"
+        self._url_orders = f"{self.pretix_api_url}/orders/"
 
-        self.session = requests.Session()
+        # reuse the session of previous runs to keep its connections (and TLS sessions) alive
+        if self.__class__._session is None:
+            self.__class__._session = self._create_session()
+
+        self.session = self.__class__._session
         self.session.headers.update({"Authorization": f"Token {pretix_api_token}"})
 
+        # questions and items fetched by this instance, reused for the rest of the run regardless of the TTL
+        self._question_map_cache = None
+        self._item_map_cache = None
+
+    def _create_session(self) -> requests.Session:
+        """
+        Create a HTTP session with retries and a connection pool for the Pretix API.
+        """
+
+        session = requests.Session()
+        session.headers.update({
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+        })
+
         retries = Retry(
             total=5,
             backoff_factor=0.5,
-            status_forcelist=[500, 502, 503, 504],
+            status_forcelist=[429, 500, 502, 503, 504],
             allowed_methods=["GET"],
         )
 
-        adapter = HTTPAdapter(max_retries=retries)
-        self.session.mount("https://", adapter)
-        self.session.mount("http://", adapter)
+        adapter = HTTPAdapter(
+            max_retries=retries,
+            pool_connections=32,
+            pool_maxsize=32,
+            pool_block=False,
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        return session
+
+    @classmethod
+    def invalidate(cls) -> None:
+        """
+        Drop all cached Pretix data and the validators of conditional requests, so that the next run fetches everything again.
+        Instances created before keep their questions and items for the rest of their run.
+        """
+
+        cls._questions_cache = None
+        cls._items_cache = None
+        cls._question_ids_by_text_cache = None
+        cls._question_column_layout_cache = None
+        cls._answer_choices_cache = None
+        cls._last_source_maps = None
+        cls._validators = {}
+
+    def _get_page(self, url: str, page: int = None) -> dict:
+        """
+        Fetch a single page of a paginated Pretix API list endpoint.
+        """
+
+        params = {"page": page} if page is not None else None
+
+        r = self.session.get(url, params=params, timeout=self.REQUEST_TIMEOUT)
+        r.raise_for_status()
+
+        return orjson.loads(r.content)
+
+    def _get_first_page(self, url: str, conditional: bool = False) -> dict | None:
+        """
+        Fetch the first page of a paginated Pretix API list endpoint and remember its ETag/Last-Modified.
+        If 'conditional' is True, the validators of the last fetch are sent and None is returned if Pretix answers with 304 Not Modified.
+        """
+
+        validators = self.__class__._validators.get(url)
+        headers = validators if conditional and validators else None
+
+        r = self.session.get(url, headers=headers, timeout=self.REQUEST_TIMEOUT)
+
+        if r.status_code == 304:
+            return None
+
+        r.raise_for_status()
+
+        self.__class__._validators[url] = {
+            header: r.headers[response_header]
+            for header, response_header in (("If-None-Match", "ETag"), ("If-Modified-Since", "Last-Modified"))
+            if r.headers.get(response_header)
+        }
+
+        return orjson.loads(r.content)
+
+    def _iter_paginated_results(self, url: str, first_page: dict = None) -> Iterator[dict]:
+        """
+        Fetch all results of a paginated Pretix API list endpoint and return an iterator over them.
+        The first page is fetched right away (unless already passed as 'first_page') and reveals the total count, so all remaining pages are requested concurrently.
+        Results are yielded page by page, so pages that have been consumed can be freed while the rest is processed.
+        """
+
+        data = first_page if first_page is not None else self._get_page(url)
+
+        if not data.get("next"):
+            return iter(data["results"])
+
+        count = data.get("count")
+        page_size = len(data["results"])
+
+        # fall back to following the "next" links if the total number of pages is unknown
+        if not isinstance(count, int) or page_size == 0:
+            def follow_next_links(data: dict) -> Iterator[dict]:
+                yield from data["results"]
+                while data["next"]:
+                    data = self._get_page(data["next"])
+                    yield from data["results"]
 
+            return follow_next_links(data)
+
+        pages = range(2, math.ceil(count / page_size) + 1)
+
+        # executor.map() submits all pages now and returns them in order, regardless of which response arrives first
+        executor = ThreadPoolExecutor(max_workers=min(8, len(pages)))
+        page_results = executor.map(lambda page: self._get_page(url, page), pages)
+        executor.shutdown(wait=False)
+
+        def iter_pages(first_results: list) -> Iterator[dict]:
+            yield from first_results
+            for page_data in page_results:
+                yield from page_data["results"]
+
+        return iter_pages(data["results"])
+
+    def _is_cache_valid(self, cache: tuple[float, dict] | None) -> bool:
+        """
+        Check if a (timestamp, data) cache entry exists and is younger than the configured TTL.
+        """
+
+        return cache is not None and time.monotonic() - cache[0] < self.cache_ttl
+
+    @staticmethod
+    def _pick_lang(translations: dict, langs: tuple = PREFERRED_LANGUAGES) -> str:
+        """
+        Return the first non-empty translation in the preferred languages, falling back to the first available one.
+        """
+
+        for lang in langs:
+            text = translations.get(lang)
+            if text:
+                return text
+
+        return next(iter(translations.values()), "")
 
     def _get_questions(self) -> dict:
         """
         Fetch all questions from Pretix API and return a mapping of question ID to question text.
+        Reuses the last fetched mapping as long as it is younger than 'PRETIX_CACHE_TTL_SECONDS'.
+        An expired mapping is revalidated with a conditional request and kept if Pretix reports no change.
         """
 
-        url = f"{self.pretix_api_url}/questions/"
+        if self._question_map_cache is not None:
+            return self._question_map_cache
+
+        cache = self.__class__._questions_cache
+        if self._is_cache_valid(cache):
+            self._question_map_cache = cache[1]
+            return self._question_map_cache
+
+        first_page = self._get_first_page(self._url_questions, conditional=cache is not None)
+
+        if first_page is None:
+            # unchanged since the last fetch, keep the same mapping (and everything cached for it) for another TTL
+            self.__class__._questions_cache = (time.monotonic(), cache[1])
+            self._question_map_cache = cache[1]
+            return self._question_map_cache
+
         questions = {}
 
-        while url:
-            r = self.session.get(url)
+        for q in self._iter_paginated_results(self._url_questions, first_page):
+            question_text = self._pick_lang(q["question"], self.NAME_LANGUAGES)
+            questions[q["id"]] = question_text
+
+        self.__class__._questions_cache = (time.monotonic(), questions)
+        self._question_map_cache = questions
+
+        return questions
+
+
+    def _get_question_ids_by_text(self) -> dict:
+        """
+        Return a mapping of normalized (stripped, lower-case) question text to all question IDs with that text.
+        The mapping is built once per fetched question map and reused as long as the question map is.
+        """
+
+        question_map = self._get_questions()
+
+        cache = self.__class__._question_ids_by_text_cache
+        if cache is not None and cache[0] is question_map:
+            return cache[1]
+
+        question_ids_by_text = {}
+        for qid, text in question_map.items():
+            question_ids_by_text.setdefault((text or "").strip().lower(), []).append(qid)
+
+        self.__class__._question_ids_by_text_cache = (question_map, question_ids_by_text)
+
+        return question_ids_by_text
+
+    def _get_question_details(self, qid: int) -> dict:
+        """
+        Fetch the details of a single question (including its answer options) from Pretix API.
+        """
+
+        url = f"{self._url_questions}{qid}/"
+        try:
+            r = self.session.get(url, timeout=self.REQUEST_TIMEOUT)
             r.raise_for_status()
-            data = r.json()
+            return orjson.loads(r.content)
+        except Exception as e:
+            raise Exception(f"Error fetching choices for question id {qid}: {e}")
 
-            for q in data["results"]:
-                question_text = q["question"].get("de") or next(iter(q["question"].values()))
-                questions[q["id"]] = question_text
 
-            url = data["next"]  # Pagination
+    @staticmethod
+    def _extract_choice_text(opt) -> str | None:
+        """
+        Extract a human-readable string from an answer option entry of the Pretix API.
+        """
 
-        return questions
+        # plain string option
+        if isinstance(opt, str):
+            return opt.strip() or None
 
+        if not isinstance(opt, dict):
+            return None
+
+        # prefer common direct string keys
+        for k in PretixAPI.CHOICE_TEXT_KEYS:
+            v = opt.get(k)
+            if isinstance(v, str) and v.strip():
+                return v.strip()
+
+            # if the value is a translations dict (e.g. {"de": "..."}), prefer German then English
+            if isinstance(v, dict):
+                for lang in PretixAPI.PREFERRED_LANGUAGES:
+                    if (
+                        lang in v
+                        and isinstance(v[lang], str)
+                        and v[lang].strip()
+                    ):
+                        return v[lang].strip()
+                # fallback to first available string in translations
+                for vv in v.values():
+                    if isinstance(vv, str) and vv.strip():
+                        return vv.strip()
+
+        # if no labelled text found, try to find any string value in the dict
+        for vv in opt.values():
+            if isinstance(vv, str) and vv.strip():
+                return vv.strip()
+
+        # nothing human-readable found
+        return None
+
+    def _fetch_choices_for_qid(self, qid: int) -> set[str]:
+        """
+        Fetch a single question from Pretix API and return the set of its human-readable answer options.
+        """
+
+        data = self._get_question_details(qid)
+
+        try:
+            # fast path: current Pretix API versions expose the answer options under "options"
+            options = data.get("options")
+            if not isinstance(options, list):
+                options = []
+
+            # pretix may expose options under different keys depending on API version/implementation
+            if not options:
+                logging.debug("Question id %s has no 'options' list. Searching other keys for answer options.", qid)
+
+                for key in (
+                    "choices",
+                    "answers",
+                    "options_list",
+                    "question_options",
+                ):
+                    if key in data and isinstance(data[key], list):
+                        options = data[key]
+                        break
+
+            # fallback: sometimes the question detail may include nested structures
+            if not options:
+                # try to find any list-valued field in response that looks like options
+                for v in data.values():
+                    if isinstance(v, list) and v and isinstance(v[0], (str, dict)):
+                        options = v
+                        break
+
+            choices = {text_val for text_val in map(self._extract_choice_text, options) if text_val}
+
+        except Exception as e:
+            raise Exception(f"Error fetching choices for question id {qid}: {e}")
+
+        return choices
 
     def get_answer_choices_from_question(self, question_str: str) -> list:
         """
@@ -483,256 +966,286 @@ class PretixAPI:
         returned answer options are merged uniquely and this fact is logged.
 
         Returns a sorted list of unique answer option strings.
+        The answer options are fetched once per fetched question map and reused as long as the question map is.
         """
 
         if not question_str.strip():
             raise Exception("Empty question text provided to get_answer_choices_from_question()")
 
-        # build a fresh mapping of id -> text (ensures up-to-date data)
-        question_map = self._get_questions()
+        # mapping of normalized text -> ids (rebuilt only when the question map is fetched again)
+        question_ids_by_text = self._get_question_ids_by_text()
 
         # case-insensitive match on the visible question text
         target = question_str.strip().lower()
-        matching_qids = [
-            qid
-            for qid, text in question_map.items()
-            if (text or "").strip().lower() == target
-        ]
+
+        question_map = self._get_questions()
+        cache = self.__class__._answer_choices_cache
+        if cache is None or cache[0] is not question_map:
+            cache = self.__class__._answer_choices_cache = (question_map, {})
+        if target in cache[1]:
+            return list(cache[1][target])
+
+        matching_qids = list(question_ids_by_text.get(target, []))
 
         if not matching_qids:
             raise Exception(f"No question IDs found for question text '{question_str}'")
 
         all_choices = set()
 
-        for qid in matching_qids:
-            url = f"{self.pretix_api_url}/questions/{qid}/"
-            try:
-                r = self.session.get(url)
-                r.raise_for_status()
-                data = r.json()
-
-                # pretix may expose options under different keys depending on API version/implementation
-                options = []
-                for key in (
-                    "options",
-                    "choices",
-                    "answers",
-                    "options_list",
-                    "question_options",
-                ):
-                    if key in data and isinstance(data[key], list):
-                        options = data[key]
-                        break
-
-                # fallback: sometimes the question detail may include nested structures
-                if not options:
-                    # try to find any list-valued field in response that looks like options
-                    for v in data.values():
-                        if isinstance(v, list) and v and isinstance(v[0], (str, dict)):
-                            options = v
-                            break
-
-                # extract a human-readable string from each option entry.
-                def _extract_choice_text(opt) -> str | None:
-                    # plain string option
-                    if isinstance(opt, str):
-                        return opt.strip() or None
-
-                    if not isinstance(opt, dict):
-                        return None
-
-                    # prefer common direct string keys
-                    for k in ("label", "text", "answer", "name", "title", "display"):
-                        v = opt.get(k)
-                        if isinstance(v, str) and v.strip():
-                            return v.strip()
-
-                        # if the value is a translations dict (e.g. {"de": "..."}), prefer German then English
-                        if isinstance(v, dict):
-                            for lang in ("de", "de-DE", "en", "en-US"):
-                                if (
-                                    lang in v
-                                    and isinstance(v[lang], str)
-                                    and v[lang].strip()
-                                ):
-                                    return v[lang].strip()
-                            # fallback to first available string in translations
-                            for vv in v.values():
-                                if isinstance(vv, str) and vv.strip():
-                                    return vv.strip()
-
-                    # if no labelled text found, try to find any string value in the dict
-                    for vv in opt.values():
-                        if isinstance(vv, str) and vv.strip():
-                            return vv.strip()
-
-                    # nothing human-readable found
-                    return None
-
-                for opt in options:
-                    text_val = _extract_choice_text(opt)
-                    if text_val:
-                        all_choices.add(text_val)
-
-            except Exception as e:
-                raise Exception(f"Error fetching choices for question id {qid}: {e}")
+        # fetch and parse the answer options of all matching questions concurrently instead of one after another
+        with ThreadPoolExecutor(max_workers=min(8, len(matching_qids))) as executor:
+            for choices in executor.map(self._fetch_choices_for_qid, matching_qids):
+                all_choices |= choices
 
         if len(matching_qids) > 1:
             logging.info(f"Multiple question IDs {matching_qids} map to the same question text '{question_str}'. Merged unique choices ({len(all_choices)} unique).")
 
-        return sorted(all_choices)
+        cache[1][target] = sorted(all_choices)
+
+        return list(cache[1][target])
 
 
     def _get_items(self) -> dict:
         """
         Fetch all items from Pretix API and return a mapping of item ID to item name.
+        Reuses the last fetched mapping as long as it is younger than 'PRETIX_CACHE_TTL_SECONDS'.
+        An expired mapping is revalidated with a conditional request and kept if Pretix reports no change.
         """
 
-        url = f"{self.pretix_api_url}/items/"
-        items = {}
+        if self._item_map_cache is not None:
+            return self._item_map_cache
 
-        while url:
-            r = self.session.get(url)
-            r.raise_for_status()
-            data = r.json()
+        cache = self.__class__._items_cache
+        if self._is_cache_valid(cache):
+            self._item_map_cache = cache[1]
+            return self._item_map_cache
+
+        first_page = self._get_first_page(self._url_items, conditional=cache is not None)
+
+        if first_page is None:
+            # unchanged since the last fetch, keep the same mapping for another TTL
+            self.__class__._items_cache = (time.monotonic(), cache[1])
+            self._item_map_cache = cache[1]
+            return self._item_map_cache
+
+        items = {}
 
-            for i in data["results"]:
-                item_name = i["name"].get("de") or next(iter(i["name"].values()))
-                items[i["id"]] = item_name
+        for i in self._iter_paginated_results(self._url_items, first_page):
+            item_name = self._pick_lang(i["name"], self.NAME_LANGUAGES)
+            items[i["id"]] = item_name
 
-            url = data["next"]  # Pagination
+        self.__class__._items_cache = (time.monotonic(), items)
+        self._item_map_cache = items
 
         return items
 
 
-    def _get_orders(self) -> list:
+    def _get_orders(self, conditional: bool = False) -> Iterator[dict] | None:
         """
-        Fetch all orders from Pretix API and return as a list of order dicts.
+        Fetch all orders from Pretix API and return an iterator over the order dicts.
+        If 'conditional' is True, the first page is requested with the ETag/Last-Modified of the last fetch
+        and None is returned if Pretix answers with 304 Not Modified, before any further page is fetched.
         """
 
-        url = f"{self.pretix_api_url}/orders/"
-        orders = []
+        first_page = self._get_first_page(self._url_orders, conditional)
 
-        while url:
-            r = self.session.get(url)
-            r.raise_for_status()
-            data = r.json()
-
-            orders.extend(data["results"])
-            url = data["next"]  # Pagination
+        if first_page is None:
+            return None
 
-        return orders
+        return self._iter_paginated_results(self._url_orders, first_page)
 
 
-    def _get_unique_column_name(self, base_name: str, existing_columns: list) -> str:
+    def _get_unique_column_name(self, base_name: str, used_names: set) -> str:
         """
         Generate a unique column name by adding (#2), (#3), etc. suffix if needed.
+        The returned name is added to used_names.
         """
 
-        if base_name not in existing_columns:
-            return base_name
+        name = base_name
 
         # Find the next available number
         counter = 2
-        while f"{base_name} (#{counter})" in existing_columns:
+        while name in used_names:
+            name = f"{base_name} (#{counter})"
             counter += 1
 
-        return f"{base_name} (#{counter})"
+        used_names.add(name)
+
+        return name
 
 
-    def get_raw_df(self) -> pd.DataFrame:
+    def _question_column_layout(self, question_map: dict) -> dict[str, str]:
         """
-        Fetch raw data from Pretix API and return as a pandas DataFrame.
+        Map every question text to a unique column name for get_raw_df().
+        Only question texts are made unique among each other, a question named like an order or position column shares that column.
+        The layout is computed once per fetched question map and reused as long as the question map is.
         """
 
-        question_map = self._get_questions()
-        item_map = self._get_items()
-        orders = self._get_orders()
+        cache = self.__class__._question_column_layout_cache
+        if cache is not None and cache[0] is question_map:
+            return cache[1]
 
-        rows = []
-        # Track which question texts we've already seen to handle duplicate question texts
+        used_names = set()
         question_text_mapping = {}  # maps original qtext -> unique column name
+        for qtext in question_map.values():
+            if qtext not in question_text_mapping:
+                question_text_mapping[qtext] = self._get_unique_column_name(qtext, used_names)
+
+        self.__class__._question_column_layout_cache = (question_map, question_text_mapping)
+
+        return question_text_mapping
+
+    def get_raw_df(self, success_on_last_run: bool = False) -> pd.DataFrame:
+        """
+        Fetch raw data from Pretix API and return as a pandas DataFrame.
+        If the last run was successful, orders are requested conditionally and NoDataChange is raised right away if Pretix reports no change
+        and the questions and items are the same as for the last dataframe.
+        """
+
+        # fetch questions, items and orders concurrently, each endpoint paginates on its own
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            questions_future = executor.submit(self._get_questions)
+            items_future = executor.submit(self._get_items)
+            orders_future = executor.submit(self._get_orders, success_on_last_run)
+
+            question_map = questions_future.result()
+            item_map = items_future.result()
+            orders = orders_future.result()
+
+        if orders is None:
+            # orders are unchanged, but renamed questions or items still change the dataframe
+            last_source_maps = self.__class__._last_source_maps
+            if last_source_maps is not None and last_source_maps[0] is question_map and last_source_maps[1] is item_map:
+                raise NoDataChange()
+
+            logging.debug("Orders unchanged, but questions or items changed. Fetching orders again.")
+            orders = self._get_orders()
+
+        self.__class__._last_source_maps = (question_map, item_map)
+
+        # Build the dataframe column by column: one list per column, filled with one value per position
+        columns = {col: [] for col in self.ORDER_COLUMNS + self.POSITION_COLUMNS}
+        # the column lists in the order of ORDER_COLUMNS and POSITION_COLUMNS, so the position loop appends without dict lookups
+        order_column_lists = [columns[col] for col in self.ORDER_COLUMNS]
+        position_column_lists = [columns[col] for col in self.POSITION_COLUMNS]
+        question_columns = {}  # maps unique column name -> list of answers (None if not answered)
+        row_count = 0
+
+        # copy the cached layout, unknown question ids found in the answers are added to it below
+        question_text_mapping = dict(self._question_column_layout(question_map))  # maps original qtext -> unique column name
+        used_names = set(self.ORDER_COLUMNS + self.POSITION_COLUMNS) | set(question_text_mapping.values())
+
+        # maps question id -> unique column name, extended by answer_column() for unknown question ids
+        qid_columns = {qid: question_text_mapping[qtext] for qid, qtext in question_map.items()}
+
+        def answer_column(qid) -> str:
+            if isinstance(qid, dict):
+                qid = qid["id"]
+
+            column = qid_columns.get(qid)
+            if column is None:
+                # questions unknown to the question map still need a unique column name
+                qtext = f"question_{qid}"
+                if qtext not in question_text_mapping:
+                    question_text_mapping[qtext] = self._get_unique_column_name(qtext, used_names)
+                column = qid_columns[qid] = question_text_mapping[qtext]
+
+            return column
+
+        pick_lang = self._pick_lang  # local bindings for the position loop
+        name_languages = self.NAME_LANGUAGES
+
+        # Pretix returns the item of a position as id or as expanded object. Item ids are the common case, so they
+        # are looked up directly without a type check; expanded objects are unhashable and end up in the TypeError branch.
+        def resolve_item(item) -> tuple:
+            try:
+                return item, item_map[item]
+            except KeyError:
+                return item, f"Item {item}"
+            except TypeError:
+                return item["id"], pick_lang(item["name"], name_languages)
 
         for order in orders:
             invoice = order.get("invoice_address", {}) or {}
-            order_info = {
-                "order_code": order["code"],
-                "status": order["status"],
-                "email": order["email"],
-                "total": order["total"],
-                "date": order["datetime"],
-                "invoice_name": invoice.get("name", ""),
-                "invoice_company": invoice.get("company", ""),
-                "invoice_street": invoice.get("street", ""),
-                "invoice_zipcode": invoice.get("zipcode", ""),
-                "invoice_city": invoice.get("city", ""),
-                "invoice_country": invoice.get("country", ""),
-                "invoice_vat_id": invoice.get("vat_id", ""),
-            }
+            # values in the order of ORDER_COLUMNS
+            order_values = (
+                order["code"],
+                order["status"],
+                order["email"],
+                order["total"],
+                order["datetime"],
+                invoice.get("name", ""),
+                invoice.get("company", ""),
+                invoice.get("street", ""),
+                invoice.get("zipcode", ""),
+                invoice.get("city", ""),
+                invoice.get("country", ""),
+                invoice.get("vat_id", ""),
+            )
 
             for position in order["positions"]:
-                # resolve item id
-                item_id = position.get("item")
-                if isinstance(item_id, dict):
-                    item_name = item_id["name"].get("de") or next(iter(item_id["name"].values()))
-                else:
-                    item_name = item_map.get(item_id, f"Item {item_id}")
+                # resolve item id and name
+                item_id, item_name = resolve_item(position.get("item"))
 
                 # attendee name from attendee_name_parts
                 name_parts = position.get("attendee_name_parts", {}) or {}
                 attendee_firstname = name_parts.get("given_name", "")
                 attendee_lastname = name_parts.get("family_name", "")
 
-                pos_info = {
-                    "position_id": position["id"],
-                    "item_id": item_id if not isinstance(item_id, dict) else item_id["id"],
-                    "item_name": item_name,
-                    "price": position["price"],
-                    "attendee_firstname": attendee_firstname,
-                    "attendee_lastname": attendee_lastname,
-                    "attendee_email": position.get("attendee_email", ""),
-                    "attendee_street": position.get("street", ""),
-                    "attendee_zipcode": position.get("zipcode", ""),
-                    "attendee_city": position.get("city", ""),
-                    "attendee_country": position.get("country", ""),
-                }
-
-                # answers for questions
-                questions = {}
-                for answer in position.get("answers", []):
-                    qid = answer.get("question")
-                    answer_text = answer.get("answer", "")
-
-                    if isinstance(qid, dict):
-                        qid = qid["id"]
-
-                    qtext = question_map.get(qid, f"question_{qid}")
+                # values in the order of POSITION_COLUMNS
+                pos_values = (
+                    position["id"],
+                    item_id,
+                    item_name,
+                    position["price"],
+                    attendee_firstname,
+                    attendee_lastname,
+                    position.get("attendee_email", ""),
+                    position.get("street", ""),
+                    position.get("zipcode", ""),
+                    position.get("city", ""),
+                    position.get("country", ""),
+                )
 
-                    # Generate unique column name for this question text
-                    if qtext not in question_text_mapping:
-                        question_text_mapping[qtext] = self._get_unique_column_name(qtext, list(question_text_mapping.values()))
+                for column, value in zip(order_column_lists, order_values):
+                    column.append(value)
+                for column, value in zip(position_column_lists, pos_values):
+                    column.append(value)
 
-                    unique_col_name = question_text_mapping[qtext]
-                    questions[unique_col_name] = answer_text
+                # answers for questions, mapped to their unique column names
+                answered = {
+                    answer_column(answer.get("question")): answer.get("answer", "")
+                    for answer in position.get("answers", ())
+                }
+                for col, answer_text in answered.items():
+                    column = question_columns.setdefault(col, [])
+                    # back-fill positions that did not answer this question
+                    column.extend([None] * (row_count - len(column)))
+                    column.append(answer_text)
 
-                row = {**order_info, **pos_info, **questions}
-                rows.append(row)
+                row_count += 1
 
-        df = pd.DataFrame(rows)
+        # pad question columns for the last positions that did not answer them
+        for column in question_columns.values():
+            column.extend([None] * (row_count - len(column)))
 
         # Ensure all questions from Pretix are present as columns even if
-        # no attendee has answered them yet. Handle duplicate question texts with (#2), (#3), etc.
-        for qid, qtext in question_map.items():
-            # Generate unique column name for this question text
-            if qtext not in question_text_mapping:
-                unique_col_name = self._get_unique_column_name(qtext, list(question_text_mapping.values()) + list(df.columns))
-                question_text_mapping[qtext] = unique_col_name
-            else:
-                unique_col_name = question_text_mapping[qtext]
-
-            # Add empty column if it doesn't exist yet
-            if unique_col_name not in df.columns:
-                df[unique_col_name] = ""
+        # no attendee has answered them yet. They are part of the constructor input, so no column is added afterwards.
+        empty_columns = {}
+        for col in question_text_mapping.values():
+            if col in question_columns:
+                continue
+            if col in columns:
+                # an unanswered question named like an order or position column must not blank that column
+                col = self._get_unique_column_name(col, used_names)
+            empty_columns[col] = [""] * row_count
+
+        # answers to a question named like an order or position column replace its value in the positions that answered it
+        for col in columns.keys() & question_columns.keys():
+            answers = question_columns.pop(col)
+            columns[col] = [value if answer is None else answer for value, answer in zip(columns[col], answers)]
+
+        df = pd.DataFrame({**columns, **question_columns, **empty_columns})
         
         if df.empty:
             raise Exception("No data fetched from Pretix API.")
@@ -741,60 +1254,82 @@ class PretixAPI:
 
         return df
 
+    @staticmethod
+    def _get_data_digest(df: pd.DataFrame) -> bytes:
+        """
+        Hash the column names and all values of a dataframe into a short digest, so that runs can be compared without keeping the last dataframe.
+        """
+
+        hasher = hashlib.blake2b(digest_size=32)
+        hasher.update("\x1f".join(map(str, df.columns)).encode())
+        # one vectorized 64 bit hash per row (including the index), fed to blake2b as a single buffer
+        hasher.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+
+        return hasher.digest()
+
     def check_for_new_fetched_data(self, raw_df: pd.DataFrame, success_on_last_run: bool = False) -> None:
         """
         Check if the newly fetched raw_df is different from the last fetched data. Raises an Exception if the data is duplicate.
         """
 
+        digest = self._get_data_digest(raw_df)
+
         if not success_on_last_run:
             logging.debug("Last run did not complete successfully (or is run the first time). Skipping data change check and continuing processing.")
         
-        elif not raw_df.equals(self.__class__.last_raw_df):
+        elif digest != self.__class__.last_raw_digest:
             logging.debug("Data check: data fetched from Pretix API contains new data. Continue processing.")
         
         else:
             # raise exception if no new data occured so that Main can skip this run
-            raise Exception("No changes in data since last fetch.")
+            raise NoDataChange()
         
-        self.__class__.last_raw_df = raw_df.copy()
+        self.__class__.last_raw_digest = digest
     
     
 class FilenameHandling():
+    # replacements of invalid characters in paths, applied in a single pass with str.translate()
+    PATH_TRANSLATION = str.maketrans({
+        "\n": " ",
+        "\r": " ",
+        "\t": " ",
+        "<": "_",
+        ">": "_",
+        ":": "",
+        '"': "",
+        "|": "_",
+        "?": "",
+        "*": "",
+        "%": "",
+    })
+    # filenames additionally must not contain path separators
+    FILENAME_TRANSLATION = str.maketrans({
+        "\n": " ",
+        "\r": " ",
+        "\t": " ",
+        "<": "_",
+        ">": "_",
+        ":": "",
+        '"': "",
+        "/": "+",
+        "\\": "_",
+        "|": "_",
+        "?": "",
+        "*": "",
+        "%": "",
+    })
+
     def sanitize_filename(self, filename: str) -> str:
         """
         Sanitize the filename by replacing or removing invalid characters.
         """
         
-        filename = filename.replace("\n", " ")
-        filename = filename.replace("\r", " ")
-        filename = filename.replace("\t", " ")
-        filename = filename.replace("<", "_")
-        filename = filename.replace(">", "_")
-        filename = filename.replace(":", "")
-        filename = filename.replace('"', "")
-        filename = filename.replace("/", "+")
-        filename = filename.replace("\\", "_")
-        filename = filename.replace("|", "_")
-        filename = filename.replace("?", "")
-        filename = filename.replace("*", "")
-        filename = filename.replace("%", "")
-        filename = filename.strip()
+        filename = filename.translate(self.FILENAME_TRANSLATION).strip()
         
         return filename
     
     def sanitize_path(self, path:str) -> str:
-        path = path.replace("\n", " ")
-        path = path.replace("\r", " ")
-        path = path.replace("\t", " ")
-        path = path.replace("<", "_")
-        path = path.replace(">", "_")
-        path = path.replace(":", "")
-        path = path.replace('"', "")
-        path = path.replace("|", "_")
-        path = path.replace("?", "")
-        path = path.replace("*", "")
-        path = path.replace("%", "")
-        path = path.strip()
+        path = path.translate(self.PATH_TRANSLATION).strip()
         
         # remove trailing dots
         while path.endswith("."):
@@ -823,15 +1358,12 @@ class FilenameHandling():
         # ensure that the path does not end with a slash
         path = path.rstrip("/\\")
 
-        parent_dirs = []
+        # absolute paths keep their leading slash
+        prefix = "/" if path.startswith("/") else ""
+        parts = [part for part in path.split("/") if part]
 
-        # walk through the path and build the parent directories
-        while path != os.path.dirname(path):
-            parent_dirs.append(path)
-            path = os.path.dirname(path)
-
-        # reverse the list to have the directories in hierarchical order from top to bottom.
-        return parent_dirs[::-1]
+        # build the directories in hierarchical order from top to bottom in a single pass
+        return [prefix + parent_dir for parent_dir in itertools.accumulate(parts, lambda a, b: f"{a}/{b}")]
 
 
 class Excel:
@@ -841,9 +1373,17 @@ class Excel:
         """
         env = Environment()
         self.max_column_width = env.get_excel_max_column_width()
+        self.width_sample_rows = env.get_excel_width_sample_rows()  # larger dataframes get their column widths from a sample of this many rows
         temp_dir_name = "p2n_" + FilenameHandling().sanitize_filename(env.get_pretix_event_slug())
         
-        self.temp_dir = os.path.join(tempfile.gettempdir(), temp_dir_name)
+        # prefer the memory-backed /dev/shm, files are only written to be uploaded and deleted right afterwards
+        shm_dir = "/dev/shm"
+        if os.path.isdir(shm_dir) and os.access(shm_dir, os.W_OK):
+            base_dir = shm_dir
+        else:
+            base_dir = tempfile.gettempdir()
+
+        self.temp_dir = os.path.join(base_dir, temp_dir_name)
         Path(self.temp_dir).mkdir(parents=True, exist_ok=True)
 
     def _escape_excel_formula(self, value):
@@ -851,15 +1391,20 @@ class Excel:
             return "'" + value
         return value
     
-    def _protect_against_formula_injection(self, df: pd.DataFrame) -> pd.DataFrame:
+    def protect_against_formula_injection(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Return a copy of the dataframe in which text cells starting like a formula are escaped, for every spreadsheet output (Excel and CSV).
+        """
         new_df = df.copy()
         for col in new_df.select_dtypes(include="object").columns:
             new_df[col] = new_df[col].apply(self._escape_excel_formula)
         return new_df
 
-    def save_to_excel(self, df: pd.DataFrame, filename: str, freeze_panes: tuple[int, int] = (1, 1)) -> str:
+    def save_to_excel(self, df: pd.DataFrame, filename: str, freeze_panes: tuple[int, int] = (1, 1), with_filters: bool = False, subdir: str = "") -> str:
         """
         Save the given DataFrame to an Excel file with the specified filename in the temporary directory.
+        If with_filters is True, the data is formatted as a table with filtering function in the same pass.
+        If subdir is given, the file is saved in this subdirectory of the temporary directory, so that files with the same name for different upload directories don't collide.
         Returns the path to the saved Excel file.
         """
 
@@ -870,39 +1415,85 @@ class Excel:
 
         sheet_name = filename.removesuffix(".xlsx")
 
-        path = os.path.join(self.temp_dir, filename)
-        
-        df = self._protect_against_formula_injection(df)
-
-        # write dataframe to excel
-        with pd.ExcelWriter(path, engine="openpyxl") as writer:
-            df.to_excel(writer, sheet_name=sheet_name, index=True, freeze_panes=freeze_panes)
-            worksheet = writer.sheets[sheet_name]
-
-            # adjust column widths including index column and header
-            for idx, col in enumerate(df.columns, start=2):  # start=2 because index is in column 1
-                max_data_length = (
-                    df[col]
-                    .fillna("")
-                    .apply(lambda x: len(str(x)))
-                    .max()
-                )
-                max_length = max(
-                    len(str(col)),  # header length
-                    max_data_length,  # data length
-                )
-                length = min(max_length + 2, self.max_column_width)  # cap the width via constant
+        directory = os.path.join(self.temp_dir, FilenameHandling().sanitize_path(subdir))
+        Path(directory).mkdir(parents=True, exist_ok=True)
 
-                worksheet.column_dimensions[
-                    worksheet.cell(row=1, column=idx).column_letter
-                ].width = length
+        path = os.path.join(directory, filename)
+        
+        df = self.protect_against_formula_injection(df)
+
+        # adjust column widths including index column and header
+        # string lengths are computed vectorized per column instead of calling len() for every cell
+        # (for large dataframes on a fixed sample of rows, widths are capped by max_column_width anyway)
+        width_df = df if len(df) <= self.width_sample_rows else df.sample(n=self.width_sample_rows, random_state=0)
+        str_df = width_df.fillna("").astype(str)
+        column_widths = []
+        for idx, col in enumerate(df.columns):
+            max_length = max(
+                len(str(col)),  # header length
+                str_df.iloc[:, idx].str.len().max(),  # data length
+            )
+            column_widths.append(min(max_length + 2, self.max_column_width))  # cap the width via constant
 
-            # adjust index column width
-            max_index_length = max(
-                len(str(df.index.name or "")),  # index name length
-                df.index.astype(str).map(len).max(),  # index data length
+        # adjust index column width
+        max_index_length = max(
+            len(str(df.index.name or "")),  # index name length
+            df.index.astype(str).str.len().max(),  # index data length
+        )
+        index_width = max_index_length + 2
+
+        # write dataframe to excel with xlsxwriter, rows are streamed to the file in constant memory mode
+        # (xlsxwriter does not support tables in constant memory mode, so it is only used without filters)
+        workbook = xlsxwriter.Workbook(
+            path,
+            {
+                "constant_memory": not with_filters,
+                "strings_to_formulas": False,  # cell values are data, never formulas
+                "strings_to_urls": False,
+            },
+        )
+        worksheet = workbook.add_worksheet(sheet_name[:31])  # Excel allows at most 31 characters
+        worksheet.freeze_panes(*freeze_panes)
+
+        worksheet.set_column(0, 0, index_width)
+        for idx, width in enumerate(column_widths, start=1):  # start=1 because index is in column 0
+            worksheet.set_column(idx, idx, width)
+
+        # header and index cells are styled like pandas' to_excel() does
+        header_format = workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+
+        if with_filters is True:
+            # table with filtering function over header and data, index is in column 0
+            # (xlsxwriter needs at least one data row, so an empty dataframe gets a table with one empty row)
+            last_row = max(len(df), 1)
+            table_result = worksheet.add_table(
+                0,
+                1,
+                last_row,
+                len(df.columns),
+                {
+                    "name": "Table1",
+                    "style": "Table Style Medium 4",
+                    "columns": [{"header": str(col), "header_format": header_format} for col in df.columns],
+                },
             )
-            worksheet.column_dimensions["A"].width = max_index_length + 2
+
+            # xlsxwriter only warns and returns a negative value for invalid tables (e.g. headers that are not unique ignoring case), keep at least the filters then
+            if table_result is not None and table_result < 0:
+                logging.warning(f"Could not format '{filename}' as a table (headers must be unique ignoring case). Adding filters without table formatting.")
+                worksheet.autofilter(0, 1, last_row, len(df.columns))
+
+        worksheet.write(0, 0, df.index.name, header_format)
+        for idx, col in enumerate(df.columns, start=1):
+            worksheet.write(0, idx, col, header_format)
+
+        # missing values are written as empty cells
+        values_df = df.astype(object).where(df.notna(), None)
+        for row, (index, *values) in enumerate(values_df.itertuples(index=True, name=None), start=1):
+            worksheet.write(row, 0, index, header_format)
+            worksheet.write_row(row, 1, values)
+
+        workbook.close()
 
         logging.info(f"Created Excel file '{path}'.")
 
@@ -911,8 +1502,11 @@ class Excel:
     def add_filters(self, path_to_excel_file: str) -> str:
         """
         Add filtering function to an existing Excel file.
+        Deprecated: use save_to_excel(..., with_filters=True) instead, which adds the filters without re-reading the file.
         """
 
+        logging.warning("Excel.add_filters() is deprecated. Use Excel.save_to_excel(..., with_filters=True) instead.")
+
         path = path_to_excel_file
 
         if not os.path.isfile(path):
@@ -966,8 +1560,30 @@ class Excel:
         except Exception as e:
             logging.error(f"Error deleting file '{path_to_excel_file}': {e}")
 
+    def delete_stale_files(self, max_age_seconds: int = 3600) -> None:
+        """
+        Delete temporary files that are older than max_age_seconds, e.g. left over by an aborted run.
+        """
+
+        now = time.time()
+
+        for path in Path(self.temp_dir).rglob("*"):
+            try:
+                if path.is_file() and now - path.stat().st_mtime > max_age_seconds:
+                    path.unlink()
+                    logging.info(f"Deleted stale temporary file '{path}'.")
+            except Exception as e:
+                logging.error(f"Error deleting file '{path}': {e}")
+
 
 class Cloud:
+    # Content-Type of uploaded files by extension, anything else is uploaded as application/octet-stream
+    CONTENT_TYPES = {
+        ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        ".csv": "text/csv; charset=utf-8",
+        ".txt": "text/plain; charset=utf-8",
+    }
+
     def __init__(self):
         """
         Initialize Nextcloud connection with environment variables.
@@ -980,7 +1596,13 @@ class Cloud:
         self.upload_dir = env.get_nextcloud_upload_dir()
         self.time_zone = env.get_timezone()
 
-        self.base_url = os.path.join(nextcloud_url, "remote.php/dav/files", username)
+        # resolve the timezone once, zoneinfo uses the system's tz database and pytz is the fallback if that is missing
+        try:
+            self.tz = ZoneInfo(self.time_zone)
+        except Exception:
+            self.tz = pytz.timezone(self.time_zone)
+
+        self.base_url = self._join(nextcloud_url, "remote.php/dav/files", username)
         
         self.session = requests.Session()
         self.session.auth = HTTPBasicAuth(username, password)
@@ -992,21 +1614,59 @@ class Cloud:
             allowed_methods=["MKCOL", "PUT", "GET", "HEAD", "DELETE"],
         )
 
-        adapter = HTTPAdapter(max_retries=retries)
+        # keep a pool of connections alive for the burst of uploads in every run, at least one connection per upload worker
+        pool_size = max(16, env.get_upload_workers())
+        adapter = HTTPAdapter(max_retries=retries, pool_connections=pool_size, pool_maxsize=pool_size)
         self.session.mount("https://", adapter)
         self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Connection": "keep-alive",
+            "Accept-Encoding": "gzip, deflate",  # WebDAV responses (e.g. error messages) are plain text
+        })
         
         self.last_updated_subdir = ""
+
+        # Cloud methods run on the upload worker threads of Main, so mutable state shared between calls needs a lock
+        self._known_dirs: set[str] = set()  # directories that are known to exist on Nextcloud, kept across runs
+        self._known_dirs_lock = threading.Lock()  # guards every read and update of _known_dirs
         
-    def create_dir(self, directory: str) -> None:
+    @staticmethod
+    def _join(*parts: str) -> str:
+        """
+        Join parts of a WebDAV URL or remote path with "/", ignoring empty parts and surplus slashes at their ends.
+        """
+
+        return "/".join(part.strip("/") for part in parts if part and part.strip("/"))
+
+    def _url(self, *parts: str) -> str:
+        """
+        Return the WebDAV URL of the remote path given in parts.
+        """
+
+        return self._join(self.base_url, *parts)
+
+    def _get_full_dir(self, directory: str) -> str:
+        """
+        Return the sanitized remote path of a directory in the upload directory.
+        """
+
+        return FilenameHandling().sanitize_path(self._join(self.upload_dir, directory))
+
+    def create_dir(self, directory: str, force: bool = False) -> bool:
         """
         Create directory on Nextcloud.
+        Returns True if no request was sent because the directory is known to exist from an earlier call, unless force is True.
         """
         
-        full_dir = os.path.join(self.upload_dir, directory)
-        full_dir = FilenameHandling().sanitize_path(full_dir)
-        webdav_url = os.path.join(self.base_url, full_dir)
+        full_dir = self._get_full_dir(directory)
+        webdav_url = self._url(full_dir)
         
+        # skip the MKCOL request if the directory was already created or found in this instance
+        if not force:
+            with self._known_dirs_lock:
+                if full_dir.rstrip("/") in self._known_dirs:
+                    return True
+
         if "../" in full_dir or "/.." in full_dir:  # if directory tries to use parent directories and tries to upload to a destination outside of the given upload directory
             logging.warning(f"DO NOT USE '/../' segments in your directory path! This may create directories outside your upload directory! PROCEED WITH CAUTION ON YOUR OWN RISK!\nURL: {webdav_url}")
         
@@ -1014,63 +1674,97 @@ class Cloud:
             # Try to create the direct directory first
             r = self.session.request(
                 method="MKCOL",
-                url=os.path.join(webdav_url),
+                url=webdav_url,
             )
 
+            # if the directory exists or was created, all of its parents exist as well
             if r.status_code == 405:
-                logging.debug(f"Nextcloud directory already exists ({webdav_url})")
-                return
+                logging.debug("Nextcloud directory already exists (%s)", webdav_url)
+                with self._known_dirs_lock:
+                    self._known_dirs.update(FilenameHandling().get_parent_directories(full_dir))
+                return False
             
             if r.status_code == 201:
-                logging.debug(f"Created Nextcloud directory ({webdav_url})")
+                logging.debug("Created Nextcloud directory (%s)", webdav_url)
                 logging.info(f"Created Nextcloud directory ({full_dir})")
-                return
+                with self._known_dirs_lock:
+                    self._known_dirs.update(FilenameHandling().get_parent_directories(full_dir))
+                return False
             
             if r.status_code == 409:
-                logging.debug(f"Creating Nextcloud directory: Parent node does not exist ({webdav_url}). Creating parent directories now.")
+                logging.debug("Creating Nextcloud directory: Parent node does not exist (%s). Creating parent directories now.", webdav_url)
                 
-                dir_path = os.path.join(self.upload_dir, directory)
+                dir_path = self._join(self.upload_dir, directory)
                 for dir in FilenameHandling().get_parent_directories(dir_path):
                     r = self.session.request(
                         method="MKCOL",
-                        url=os.path.join(self.base_url, dir),
+                        url=self._url(dir),
                     )
 
                     if r.status_code not in [201, 405]:
                         raise Exception(f"Error creating Nextcloud directory: {r.status_code} - {r.text}")
 
-                logging.debug(f"Created Nextcloud directory ({webdav_url})")
+                    with self._known_dirs_lock:
+                        self._known_dirs.add(dir)
+
+                logging.debug("Created Nextcloud directory (%s)", webdav_url)
                 logging.info(f"Created Nextcloud directory ({full_dir})")
+                with self._known_dirs_lock:
+                    self._known_dirs.add(full_dir.rstrip("/"))
 
         except Exception as e:
             raise Exception(f"Error creating upload directory: {e}")
+
+        return False
         
         
     
-    def upload_file(self, filename: str, data: bytes, subdir: str = "") -> None:
+    def upload_file(self, filename: str, data: bytes | BinaryIO, subdir: str = "") -> None:
         """
         Upload a file to Nextcloud via WebDAV. Destination of the uploaded file is the given Upload Directory in env variable NEXTCLOUD_UPLOAD_DIR plus optionally a given subdirectory.
+        data can be bytes or a file opened in binary mode, which is streamed in chunks instead of being read into memory.
         """
         
         # Add parent directories in filename to subdir (e.g. "A/B/file.txt" in subdir="A" and filename = "B/file.txt")
-        filepath, filename = os.path.split(filename)
-        subdir = os.path.join(subdir, filepath.strip("/\\"))
+        filepath, _, filename = filename.rpartition("/")
+        subdir = self._join(subdir, filepath.strip("/\\"))
         
-        upload_dir = os.path.join(self.upload_dir, subdir)
+        upload_dir = self._join(self.upload_dir, subdir)
         
         if "../" in upload_dir or "/.." in upload_dir:  # if directory tries to use parent directories and tries to upload to a destination outside of the given upload directory
             raise Exception(f"DO NOT USE '/../' segments in your directory path! This may alter files outside your upload directory!\nURL: {upload_dir}")
         
-        self.create_dir(subdir)            
+        dir_was_cached = self.create_dir(subdir)
+
+        content_type = self.CONTENT_TYPES.get(os.path.splitext(filename)[1].lower(), "application/octet-stream")
+        headers = {"Content-Type": content_type}
         
         try:
             r = self.session.put(
-                url=os.path.join(self.base_url, upload_dir, filename),
+                url=self._url(upload_dir, filename),
                 data=data,
+                headers=headers,
             )
 
+            # the directory is known from an earlier run but was removed on Nextcloud since then: create it again
+            # (decided per call, other uploads into the same directory may run into the same 409 at the same time)
+            if r.status_code == 409 and dir_was_cached:
+                logging.debug("Upload directory of '%s' no longer exists. Creating it again.", filename)
+                with self._known_dirs_lock:
+                    for dir in FilenameHandling().get_parent_directories(self._get_full_dir(subdir)):
+                        self._known_dirs.discard(dir)
+                self.create_dir(subdir, force=True)
+
+                if hasattr(data, "seek"):
+                    data.seek(0)
+                r = self.session.put(
+                    url=self._url(upload_dir, filename),
+                    data=data,
+                    headers=headers,
+                )
+
             if r.status_code in (200, 201, 204):
-                logging.info(f"File '{os.path.join(subdir, filename)}' uploaded successfully.")
+                logging.info(f"File '{self._join(subdir, filename)}' uploaded successfully.")
             else:
                 raise Exception(f"Error uploading file '{filename}': {r.status_code} - {r.text}")
 
@@ -1085,7 +1779,7 @@ class Cloud:
         try:
             # Try to get existing file content
             r = self.session.get(
-                url=os.path.join(self.base_url, self.upload_dir, subdir, filename),
+                url=self._url(self.upload_dir, subdir, filename),
             )
 
             if r.status_code == 200:
@@ -1113,9 +1807,9 @@ class Cloud:
             if not filename.lower().endswith(".xlsx"):
                 raise Exception("File is not an Excel file (.xlsx)")
 
+            # stream the file instead of reading it into memory (Content-Length is taken from the file size)
             with open(source_file, "rb") as f:
-                data = f.read()
-            self.upload_file(filename, data, subdir)
+                self.upload_file(filename, f, subdir)
         except Exception as e:
             raise Exception(f"Error while uploading Excel file '{source_file}': {e}")
 
@@ -1136,8 +1830,7 @@ class Cloud:
             if not filename.lower().endswith(".txt"):
                 filename += ".txt"
 
-            tz = pytz.timezone(self.time_zone)
-            data = "Last updated:\n" + datetime.now(tz=tz).strftime("%d.%m.%Y %H:%M")
+            data = "Last updated:\n" + datetime.now(tz=self.tz).strftime("%d.%m.%Y %H:%M")
             
             if error_message:
                 data += f"\n\nERROR occurred:\n{error_message}"
@@ -1189,6 +1882,11 @@ class Main:
         self.excel = Excel()
         self.cloud = Cloud()
 
+        # uploads run in parallel to each other and to the generation of the next Excel file
+        self.pool = ThreadPoolExecutor(max_workers=Environment().get_upload_workers())
+        self.pending_uploads = []  # futures of uploads submitted in the current run
+        self.output_format = Environment().get_output_format()
+
         self.success_on_last_run = False
         self.upload_dir_tech_details = ""  # upload directory for technical files like Last_updated.txt, error logs and docker image version info.
 
@@ -1230,29 +1928,47 @@ class Main:
         # keep the scheduler running
         while True:
             schedule.run_pending()
-            time.sleep(env.get_check_interval_seconds())  # check periodically if task needs to run        
+
+            # sleep until the next run is due instead of checking periodically
+            idle_seconds = schedule.idle_seconds()
+            if idle_seconds is None:  # no run scheduled
+                idle_seconds = env.get_check_interval_seconds()
+            time.sleep(max(idle_seconds, 0))
 
     def main_wrapper(self) -> None:
         """
         Wrapper for main function with error handling.
         """
 
+        # remove temporary files left over by an aborted run
+        self.excel.delete_stale_files()
+
         try:
-            self.excel = Excel()
-            self.cloud = Cloud()
-            
             self.main()
+            self.wait_for_uploads()
             
             self.success_on_last_run = True
 
+        except NoDataChange:
+            logging.info("No changes in data detected since last fetch. Skipping upload process.")
+
+            try:
+                self.cloud.upload_last_updated(subdir=self.upload_dir_tech_details)
+            except Exception as upload_error:
+                logging.error(upload_error)
+
         except Exception as e:
-            if str(e) == "No changes in data since last fetch.":
-                logging.info("No changes in data detected since last fetch. Skipping upload process.")
-                e = ""
+            # uploads of a failed run must not overlap with the next run
+            try:
+                self.wait_for_uploads()
+            except Exception as upload_error:
+                logging.error(upload_error)
 
-            else:
-                logging.error(f"Error during execution: {e}")
-                self.success_on_last_run = False
+            logging.error(f"Error during execution: {e}")
+            self.success_on_last_run = False
+
+            # do not build the next run on data cached by a failed one
+            PretixAPI.invalidate()
                 
             try:
                 self.cloud.upload_last_updated(subdir=self.upload_dir_tech_details, error_message=e)
@@ -1262,16 +1978,51 @@ class Main:
     def upload(self, df: pd.DataFrame, filename: str, subdir: str = "", filterable: bool = False, freeze_panes: tuple[int, int] = (1, 1)) -> None:
         """
         Generate excel file from dataframe, upload excel file and delete it afterwards. Can also add filters to excel file.
+        If 'OUTPUT_FORMAT' is 'csv', a CSV file is generated in memory and uploaded instead (without filters and freeze panes).
+        Generating and uploading the Excel file run in the background, wait_for_uploads() waits for them to finish.
         """
+
+        if self.output_format == "csv":
+            filename = FilenameHandling().sanitize_filename(filename) + ".csv"
+            # utf-8 with BOM, so that Excel detects the encoding when opening the file
+            data = self.excel.protect_against_formula_injection(df).to_csv(index=True).encode("utf-8-sig")
+            self.pending_uploads.append(self.pool.submit(self.cloud.upload_file, filename, data, subdir))
+            return
         
-        filepath = self.excel.save_to_excel(df, filename, freeze_panes)
+        # writing the file (disk I/O, zip compression) of one file overlaps with the uploads and writing of the others
+        self.pending_uploads.append(self.pool.submit(self._save_upload_and_delete_excel, df, filename, subdir, filterable, freeze_panes))
 
-        if filterable is True:
-            self.excel.add_filters(filepath)
+    def _save_upload_and_delete_excel(self, df: pd.DataFrame, filename: str, subdir: str, filterable: bool, freeze_panes: tuple[int, int]) -> None:
+        """
+        Generate an excel file from dataframe, upload it to Nextcloud and delete it afterwards.
+        """
 
-        self.cloud.upload_excel(filepath, subdir)
+        filepath = self.excel.save_to_excel(df, filename, freeze_panes, with_filters=filterable, subdir=subdir)
+
+        try:
+            self.cloud.upload_excel(filepath, subdir)
+        finally:
+            self.excel.delete_excel(filepath)
+
+    def wait_for_uploads(self) -> None:
+        """
+        Wait until all uploads submitted by upload() are finished. Every failed upload is logged, then the first error is raised.
+        """
+
+        pending_uploads, self.pending_uploads = self.pending_uploads, []
+
+        errors = []
+        for future in pending_uploads:
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(e)
+                errors.append(e)
 
-        self.excel.delete_excel(filepath)
+        if errors:
+            if len(errors) > 1:
+                raise Exception(f"{len(errors)} uploads failed, first error: {errors[0]}")
+            raise errors[0]
 
     def main(self) -> None:
         """
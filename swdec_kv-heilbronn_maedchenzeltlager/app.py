@@ -43,7 +43,7 @@ class Dataframe:
 
         self.time_zone = env.get_timezone()
 
-        self.raw_df = pretix.get_raw_df()
+        self.raw_df = pretix.get_raw_df(success_on_last_run)
         
         # check for new fetched data and raise exception if no new data occured so that Main can skip this run
         pretix.check_for_new_fetched_data(self.raw_df, success_on_last_run)
@@ -66,7 +66,7 @@ class Dataframe:
         This debloated dataframe acts as a starting point for all following dataframe processing.
         """
         
-        df = self.raw_df.copy()
+        df = self.raw_df
         
         # rename needed columns
         renames = {
@@ -145,7 +145,7 @@ class Dataframe:
 
         # change date format
         df["Anmeldedatum"] = (
-            pd.to_datetime(df["Anmeldedatum"], utc=True)
+            pd.to_datetime(df["Anmeldedatum"], utc=True, format="ISO8601")
             .dt.tz_convert(self.time_zone)
             .dt.strftime("%Y-%m-%d %H:%M")
         )
@@ -192,7 +192,7 @@ class Dataframe:
         Process debloated dataframe to create a sorted dataframe for attendees with required columns.
         """
 
-        df = self.debloated_df.copy()
+        df = self.debloated_df
 
         # removed all cancelled registrations
         df = df[df["Bestellstatus"] != "storniert"]
@@ -250,7 +250,7 @@ class Dataframe:
         Process sorted dataframe for attendees to create a dictionary of dataframes filtered by busstop.
         """
 
-        df = self.debloated_df.copy()
+        df = self.debloated_df
 
         # filter for columns and set their order
         wanted_columns = [
@@ -271,9 +271,11 @@ class Dataframe:
         df_by_busstop_dict = {}
         df_busstops = (df["Zu-/Ausstieg"].dropna().astype(str).str.strip().unique())
         busstops = sorted(set(self.busstop_list) | set(df_busstops))
+        # split into busstops in a single pass, busstops without registrations get an empty dataframe
+        busstop_groups = dict(tuple(df.groupby("Zu-/Ausstieg", sort=False)))
         for busstop in busstops:
             # filter by busstop, drop column "Zu-/Ausstieg" and reset index numbers
-            busstop_df = df[df["Zu-/Ausstieg"] == busstop]
+            busstop_df = busstop_groups.get(busstop, df.iloc[0:0])
             busstop_df = busstop_df.drop(columns=["Zu-/Ausstieg"])
             busstop_df.index = range(1, len(busstop_df) + 1)
 
@@ -289,24 +291,16 @@ class Dataframe:
         Calculate and return a dataframe with counts attendees by busstop.
         """
 
-        numbers_df = pd.DataFrame(
-            {"Zu-/Ausstieg": [], "Anmeldungen": []}
-        )
-
-        # make busstop the index
-        numbers_df = numbers_df.set_index("Zu-/Ausstieg")
-
         df = self.debloated_df
 
-        # add row to numbers_df
-        numbers_df.loc["GESAMT"] = [len(df)]
+        # count all busstops in a single pass
+        busstop_counts = df["Zu-/Ausstieg"].value_counts()
 
-        # filter by busstop:
-        for busstop in self.busstop_list:
-            busstop_df = df[df["Zu-/Ausstieg"] == busstop]
+        # collect the rows first and build numbers_df once, total row first and then every busstop
+        index = ["GESAMT"] + list(self.busstop_list)
+        rows = [len(df)] + [int(busstop_counts.get(busstop, 0)) for busstop in self.busstop_list]
 
-            # add row to numbers_df
-            numbers_df.loc[busstop] = [len(busstop_df)]
+        numbers_df = pd.DataFrame({"Anmeldungen": rows}, index=pd.Index(index, name="Zu-/Ausstieg"))
 
         return numbers_df
     
@@ -315,7 +309,7 @@ class Dataframe:
         Process debloated dataframe to create a sorted dataframe for orders with required columns.
         """
         
-        df = self.debloated_df.copy()
+        df = self.debloated_df
         
         # filter for columns and set their order
         wanted_columns = [
@@ -370,7 +364,7 @@ class Dataframe:
         Process debloated dataframe to create a sorted dataframe for emergency contacts with required columns.
         """
 
-        df = self.attendees_df.copy()
+        df = self.attendees_df
         
         wanted_columns = [
             "Nachname",
@@ -400,7 +394,7 @@ class Dataframe:
         Process debloated dataframe to create a sorted dataframe for medical information with required columns.
         """
 
-        df = self.attendees_df.copy()
+        df = self.attendees_df
         
         # filter for columns and set their order
         wanted_columns = [
@@ -445,7 +439,7 @@ class Dataframe:
         Process debloated dataframe to create a sorted dataframe for diet restrictions with required columns.
         """
 
-        df = self.attendees_df.copy()
+        df = self.attendees_df
         
         # filter for columns and set their order
         wanted_columns = [
@@ -520,6 +514,9 @@ class CustomMain(Main):
         # generate and upload excel file for diet information of attendees
         self.upload(dataframe.diet_info_df, "Küche", filterable=True)
         
+        # Last_Updated.txt must only be written once all files of this run are uploaded
+        self.wait_for_uploads()
+
         self.cloud.upload_last_updated(subdir=self.upload_dir_tech_details)
         
         self.cloud.upload_docker_image_version(subdir=self.upload_dir_tech_details)
@@ -41,7 +41,7 @@ class Dataframe:
 
         self.time_zone = env.get_timezone()
 
-        self.raw_df = pretix.get_raw_df()
+        self.raw_df = pretix.get_raw_df(success_on_last_run)
         # check for new fetched data and raise exception if no new data occured so that Main can skip this run
         pretix.check_for_new_fetched_data(self.raw_df, success_on_last_run)
         
@@ -59,10 +59,10 @@ class Dataframe:
         Process raw dataframe to create a sorted dataframe with required columns.
         """
 
-        df = self.raw_df.copy()
+        df = self.raw_df
 
-        # removed all cancelled registrations
-        df = df[df["status"] != "c"]
+        # removed all cancelled registrations (boolean indexing returns a new frame, so raw_df is left untouched)
+        df = df[df["status"].to_numpy() != "c"]
 
         # rename needed columns
         renames = {
@@ -83,10 +83,10 @@ class Dataframe:
         df = df.rename(columns=renames)
         
         # combine "Fahrer Angebot Eltern" and "Fahrer Angebot Mitarbeiter" to one column "Telefonnummer"
-        df["Fahrer Angebot"] = df["Fahrer Angebot Eltern"].combine_first(df["Fahrer Angebot Mitarbeiter"])
+        df["Fahrer Angebot"] = df["Fahrer Angebot Eltern"].fillna(df["Fahrer Angebot Mitarbeiter"])
 
         # combine "Telefonnummer der Eltern" and "Telefonnummer Mitarbeiter" to one column "Telefonnummer"
-        df["Telefonnummer"] = df["Telefonnummer der Eltern"].combine_first(
+        df["Telefonnummer"] = df["Telefonnummer der Eltern"].fillna(
             df["Telefonnummer Mitarbeiter"]
         )
 
@@ -110,7 +110,7 @@ class Dataframe:
 
         # change date format
         df["Anmeldedatum"] = (
-            pd.to_datetime(df["Anmeldedatum"], utc=True)
+            pd.to_datetime(df["Anmeldedatum"], utc=True, format="ISO8601")
             .dt.tz_convert(self.time_zone)
             .dt.strftime("%Y-%m-%d %H:%M")
         )
@@ -130,7 +130,7 @@ class Dataframe:
         Process sorted dataframe to create a dictionary of dataframes filtered by town.
         """
 
-        df = self.sorted_df.copy()
+        df = self.sorted_df
 
         # filter for columns and set their order
         wanted_columns = [
@@ -152,9 +152,11 @@ class Dataframe:
         df_by_town_dict = {}
         df_towns = (df["Ortschaft"].dropna().astype(str).str.strip().unique())
         towns = sorted(set(self.towns_list) | set(df_towns))
+        # split into towns in a single pass, towns without registrations get an empty dataframe
+        town_groups = dict(tuple(df.groupby("Ortschaft", sort=False)))
         for town in towns:
             # filter by town, drop column "Ortschaft" and reset index numbers
-            town_df = df[df["Ortschaft"] == town]
+            town_df = town_groups.get(town, df.iloc[0:0])
             town_df = town_df.drop(columns=["Ortschaft"])
             town_df.index = range(1, len(town_df) + 1)
 
@@ -164,41 +166,41 @@ class Dataframe:
 
         return df_by_town_dict
 
-    def _get_numbers_df(self) -> pd.DataFrame:
+    def _get_art_mask(self, item_type: str) -> pd.Series:
         """
-        Calculate and return a dataframe with counts of "Jungscharler", "Mitarbeiter", and total by town.
+        Return a boolean mask of the sorted dataframe for all registrations whose "Art" contains item_type.
+        The substring check runs once per distinct item name instead of once per registration.
         """
 
-        numbers_df = pd.DataFrame(
-            {"Ortschaft": [], "Jungscharler": [], "Mitarbeiter": [], "Gesamt": []}
-        )
+        art = self.sorted_df["Art"]
+        matching_names = [name for name in art.dropna().unique() if item_type in str(name)]
 
-        # make Ortschaft the index
-        numbers_df = numbers_df.set_index("Ortschaft")
+        return art.isin(matching_names)
 
-        df = self.sorted_df
-
-        number_of_kids = len(df[df["Art"].str.contains("Jungscharler", na=False)])
-        number_of_staff = len(df[df["Art"].str.contains("Mitarbeiter", na=False)])
-        number_total = len(df)
+    def _get_numbers_df(self) -> pd.DataFrame:
+        """
+        Calculate and return a dataframe with counts of "Jungscharler", "Mitarbeiter", and total by town.
+        """
 
-        # add row to numbers_df
-        numbers_df.loc["GESAMT"] = [number_of_kids, number_of_staff, number_total]
+        df = self.sorted_df
 
-        # filter by town:
-        for town in self.towns_list:
-            town_df = df[df["Ortschaft"] == town]
+        # one row per registration with its item type flags, summed up per town in a single groupby pass
+        flags = pd.DataFrame(
+            {
+                "Jungscharler": self._get_art_mask("Jungscharler"),
+                "Mitarbeiter": self._get_art_mask("Mitarbeiter"),
+                "Gesamt": True,
+            },
+            index=df.index,
+        )
+        town_counts = flags.groupby(df["Ortschaft"], sort=False).sum()
 
-            town_kids = len(
-                town_df[town_df["Art"].str.contains("Jungscharler", na=False)]
-            )
-            town_staff = len(
-                town_df[town_df["Art"].str.contains("Mitarbeiter", na=False)]
-            )
-            town_total = len(town_df)
+        # build numbers_df in one go: total row first, then every town (towns without registrations count 0)
+        total_row = flags.sum().to_frame("GESAMT").T
+        numbers_df = pd.concat([total_row, town_counts.reindex(self.towns_list, fill_value=0)]).astype(int)
 
-            # add row to numbers_df
-            numbers_df.loc[town] = [town_kids, town_staff, town_total]
+        # make Ortschaft the index
+        numbers_df.index.name = "Ortschaft"
             
         logging.info("Cathegorized sorted data into numbers.")
 
@@ -209,27 +211,39 @@ class Dataframe:
         Calculate and return a dataframe with counts of different dietary restrictions.
         """
 
-        numbers_df = pd.DataFrame(
-            {"Ernährung": [], "Jungscharler": [], "Mitarbeiter": [], "Gesamt": []}
-        )
+        df = self.sorted_df
+
+        # collect the rows first and build numbers_df once at the end
+        index = []
+        rows = []
 
-        # make Ernährung the index
-        numbers_df = numbers_df.set_index("Ernährung")
+        # build the item type masks once, they are reused for every dietary group
+        is_kid = self._get_art_mask("Jungscharler").to_numpy()
+        is_staff = self._get_art_mask("Mitarbeiter").to_numpy()
         
         for i in ["Keine Besonderheiten", "Kein Schweinefleisch", "Vegetarisch", "Gesamt"]:
-
-            df = self.sorted_df.copy()
             
             # filter for current group
             if i != "Gesamt":
-                df = df[df["Ernährung"].str.contains(i, na=False)]
+                in_group = df["Ernährung"].str.contains(i, na=False, regex=False).to_numpy()
+
+                number_of_kids = int((is_kid & in_group).sum())
+                number_of_staff = int((is_staff & in_group).sum())
+                number_total = int(in_group.sum())
+            else:
+                number_of_kids = int(is_kid.sum())
+                number_of_staff = int(is_staff.sum())
+                number_total = len(df)
 
-            number_of_kids = len(df[df["Art"].str.contains("Jungscharler", na=False)])
-            number_of_staff = len(df[df["Art"].str.contains("Mitarbeiter", na=False)])
-            number_total = len(df)
+            # add row for numbers_df
+            index.append(i)
+            rows.append((number_of_kids, number_of_staff, number_total))
 
-            # add row to numbers_df
-            numbers_df.loc[i] = [number_of_kids, number_of_staff, number_total]
+        numbers_df = pd.DataFrame(
+            rows,
+            index=pd.Index(index, name="Ernährung"),
+            columns=["Jungscharler", "Mitarbeiter", "Gesamt"],
+        )
             
         logging.info("Cathegorized sorted data into dietary numbers.")
 
@@ -239,7 +253,7 @@ class Dataframe:
         """
         Returns df with only the attendees with dietary intolerances.
         """
-        df = self.sorted_df.copy()
+        df = self.sorted_df
         
         # sort for "Essensunverträglichkeiten" that are not empty
         df = df[df["Essensunverträglichkeiten"].notna()]
@@ -299,6 +313,9 @@ class CustomMain(Main):
         # generate and upload excel file for attendees with intolerances
         self.upload(dataframe.attendees_with_intolerances, "Küche_Unverträglichkeiten")
 
+        # Last_Updated.txt must only be written once all files of this run are uploaded
+        self.wait_for_uploads()
+
         self.cloud.upload_last_updated()
         
         self.cloud.upload_docker_image_version()
@@ -43,7 +43,7 @@ class Dataframe:
 
         self.time_zone = env.get_timezone()
 
-        self.raw_df = pretix.get_raw_df()
+        self.raw_df = pretix.get_raw_df(success_on_last_run)
         
         # check for new fetched data and raise exception if no new data occured so that Main can skip this run
         pretix.check_for_new_fetched_data(self.raw_df, success_on_last_run)
@@ -70,7 +70,7 @@ class Dataframe:
         This debloated dataframe acts as a starting point for all following dataframe processing.
         """
         
-        df = self.raw_df.copy()
+        df = self.raw_df
         
         # rename needed columns
         renames = {
@@ -211,7 +211,7 @@ class Dataframe:
 
         # change date format
         df["Anmeldedatum"] = (
-            pd.to_datetime(df["Anmeldedatum"], utc=True)
+            pd.to_datetime(df["Anmeldedatum"], utc=True, format="ISO8601")
             .dt.tz_convert(self.time_zone)
             .dt.strftime("%Y-%m-%d %H:%M")
         )
@@ -237,7 +237,7 @@ class Dataframe:
         Process debloated dataframe to create a sorted dataframe for attendees with required columns.
         """
 
-        df = self.debloated_df.copy()
+        df = self.debloated_df
         
         # remove all donation entries (entries with "Spende Zeltlagerarbeit" in column "Art")
         df = df[df["Art"] != "Spende Zeltlagerarbeit"]
@@ -289,7 +289,7 @@ class Dataframe:
         Process sorted dataframe for attendees to create a dictionary of dataframes filtered by town.
         """
 
-        df = self.attendees_df.copy()
+        df = self.attendees_df
 
         # filter for columns and set their order
         wanted_columns = [
@@ -313,9 +313,11 @@ class Dataframe:
         df_by_town_dict = {}
         df_towns = (df["Ort"].dropna().astype(str).str.strip().unique())
         towns = sorted(set(self.towns_list) | set(df_towns))
+        # split into towns in a single pass, towns without registrations get an empty dataframe
+        town_groups = dict(tuple(df.groupby("Ort", sort=False)))
         for town in towns:
             # filter by town, drop column "Ort" and reset index numbers
-            town_df = df[df["Ort"] == town]
+            town_df = town_groups.get(town, df.iloc[0:0])
             town_df = town_df.drop(columns=["Ort"])
             town_df.index = range(1, len(town_df) + 1)
 
@@ -332,9 +334,8 @@ class Dataframe:
         new_dfs = {}
         
         for town, town_df in self.town_dfs.items():
-            df = town_df.copy()
-            df = df.drop(columns=["Sonstiges"])
-            new_dfs[town] = df
+            # drop() already returns a new dataframe, the town dataframe itself stays untouched
+            new_dfs[town] = town_df.drop(columns=["Sonstiges"])
             
         return new_dfs
 
@@ -343,24 +344,16 @@ class Dataframe:
         Calculate and return a dataframe with counts attendees by town.
         """
 
-        numbers_df = pd.DataFrame(
-            {"Ort": [], "Anmeldungen": []}
-        )
-
-        # make Ortschaft the index
-        numbers_df = numbers_df.set_index("Ort")
-
         df = self.attendees_df
 
-        # add row to numbers_df
-        numbers_df.loc["GESAMT"] = [len(df)]
+        # count all towns in a single pass
+        town_counts = df["Ort"].value_counts()
 
-        # filter by town:
-        for town in self.towns_list:
-            town_df = df[df["Ort"] == town]
+        # collect the rows first and build numbers_df once, total row first and then every town
+        index = ["GESAMT"] + list(self.towns_list)
+        rows = [len(df)] + [int(town_counts.get(town, 0)) for town in self.towns_list]
 
-            # add row to numbers_df
-            numbers_df.loc[town] = [len(town_df)]
+        numbers_df = pd.DataFrame({"Anmeldungen": rows}, index=pd.Index(index, name="Ort"))
 
         return numbers_df
     
@@ -369,7 +362,7 @@ class Dataframe:
         Process debloated dataframe to create a sorted dataframe for orders with required columns.
         """
         
-        df = self.debloated_df.copy()
+        df = self.debloated_df
         
         # filter for columns and set their order
         wanted_columns = [
@@ -425,7 +418,7 @@ class Dataframe:
         Process debloated dataframe to create a sorted dataframe for donations with required columns.
         """
         
-        df = self.debloated_df.copy()
+        df = self.debloated_df
         
         # filter for "Spende Zeltlagerarbeit" in column "Art"
         df = df[df["Art"] == "Spende Zeltlagerarbeit"]
@@ -473,7 +466,7 @@ class Dataframe:
         Process debloated dataframe to create a sorted dataframe for emergency contacts with required columns.
         """
 
-        df = self.attendees_df.copy()
+        df = self.attendees_df
         
         wanted_columns = [
             "Nachname",
@@ -500,7 +493,7 @@ class Dataframe:
         Process debloated dataframe to create a sorted dataframe for medical information with required columns.
         """
 
-        df = self.attendees_df.copy()
+        df = self.attendees_df
 
         # filter for columns and set their order
         wanted_columns = [
@@ -538,7 +531,7 @@ class Dataframe:
         Process debloated dataframe to create a sorted dataframe for diet restrictions with required columns.
         """
 
-        df = self.attendees_df.copy()
+        df = self.attendees_df
         
         # filter for columns and set their order
         wanted_columns = [
@@ -625,6 +618,9 @@ class CustomMain(Main):
 
         self.upload_dir_tech_details = "Technische_Details"  # set upload directory for technical files like Last_updated.txt, error logs and docker image version info.
         
+        # Last_Updated.txt must only be written once all files of this run are uploaded
+        self.wait_for_uploads()
+
         self.cloud.upload_last_updated(subdir=self.upload_dir_tech_details)
         
         self.cloud.upload_docker_image_version(subdir=self.upload_dir_tech_details)